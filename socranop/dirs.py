@@ -45,6 +45,7 @@ only once, and cannot change during one program invocation.
 
 
 import abc
+import functools
 import sys
 
 from os import getenv
@@ -54,6 +55,12 @@ import socranop.constants as const
 from socranop.common import debug
 
 
+@functools.lru_cache(maxsize=None)
+def _resolved_exe_path():
+    """Resolve sys.argv[0] once; it cannot change during one program invocation"""
+    return Path(sys.argv[0]).resolve()
+
+
 class NotDetected(Exception):
     pass  # class NotDetected
 
@@ -108,17 +115,17 @@ class AbstractDirs(metaclass=abc.ABCMeta):
     @property
     def exePath(self):
         """The path the currently running executable"""
-        exename = Path(sys.argv[0]).resolve()
+        exename = _resolved_exe_path()
         if exename.suffix == ".py":
             raise ValueError("Running out of a module-based execution is not supported")
         return exename
 
-    @property
+    @functools.cached_property
     def guiExePath(self):
         """Full path to the GUI script executable"""
         return self.remove_chroot(self.exePath.parent / const.BASE_EXE_GUI)
 
-    @property
+    @functools.cached_property
     def serviceExePath(self):
         """Full path to the service script executable"""
         return self.remove_chroot(self.exePath.parent / const.BASE_EXE_SERVICE)
@@ -135,30 +142,15 @@ class AbstractDirs(metaclass=abc.ABCMeta):
             root_rel_prefix = self.PREFIX.relative_to("/")
             chr_prefix = self.chroot / root_rel_prefix
 
-        for sx_dir in ["bin", "sbin", "libexec"]:
-            for sx in [
-                const.BASE_EXE_CLI,
-                const.BASE_EXE_GUI,
-                const.BASE_EXE_SERVICE,
-                const.BASE_EXE_INSTALLTOOL,
-            ]:
-                sx_path = chr_prefix / sx_dir / sx
-                # print("sx_path", sx_path)
-                if sx_path == self.exePath:
-                    return
-                try:
-                    self.exePath.relative_to(chr_prefix)  # ignore result
-
-                    # If this is, say,
-                    # ``/home/user/.local/share/virtualenvs/socranop-ABCDEFG/bin/socranop-installtool``,
-                    # then the D-Bus and XDG config can either go into
-                    # ``/home/user/.local/share/virtualenvs/socranop-ABCDEFG/share/``
-                    # and be ignored, or go into
-                    # ``/home/user/.local/share/`` and work. We choose
-                    # the latter.
-                    return
-                except ValueError:
-                    pass  # self.exePath is not a subdir of chr_prefix
+        # Any executable below the prefix matches, be it one of ours
+        # in ``{bin,sbin,libexec}/`` or something like
+        # ``/home/user/.local/share/virtualenvs/socranop-ABCDEFG/bin/socranop-installtool``.
+        # In the latter case, the D-Bus and XDG config can either go into
+        # ``/home/user/.local/share/virtualenvs/socranop-ABCDEFG/share/``
+        # and be ignored, or go into ``/home/user/.local/share/`` and
+        # work. We choose the latter.
+        if self.exePath.is_relative_to(chr_prefix):
+            return
 
         raise NotDetected(f"Exe path is not supported: {self.exePath!r}")
 
@@ -277,7 +269,7 @@ def init_dirs(chroot=None, force_prefix=False):
             pass  # This installation is not for the current cls
 
     raise UnsupportedInstall(
-        "exename=%r, chroot=%r" % (str(Path(sys.argv[0]).resolve()), chroot)
+        "exename=%r, chroot=%r" % (str(_resolved_exe_path()), chroot)
     )
 
 
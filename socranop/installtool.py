@@ -29,12 +29,12 @@
 
 import abc
 import argparse
-import base64
 import functools
 import importlib
-import importlib.resources
 import io
+import os
 import re
+import shutil
 import sys
 import time
 
@@ -53,6 +53,11 @@ def print_step(tag, details, **printopts):
     print(f"  [{tag}] {details}", **printopts)
 
 
+def print_lines(*lines):
+    """Print a block of lines with one write instead of one per line"""
+    sys.stdout.write("".join([f"{line}\n" for line in lines]))
+
+
 class Step:
 
     """\
@@ -73,7 +78,15 @@ class Step:
             importlib.import_module("pydbus")  # import must work; discard retval
     """
 
-    def __init__(self, tag, details, success_word=None, error_msg=None, max_attempts=0):
+    def __init__(
+        self,
+        tag,
+        details,
+        success_word=None,
+        error_msg=None,
+        max_attempts=0,
+        retry_interval=1,
+    ):
         super(Step, self).__init__()
         self.tag = tag
         self.details = details
@@ -81,6 +94,7 @@ class Step:
         self.success_word = success_word
         self.attempt = 0
         self.max_attempts = max_attempts
+        self.retry_interval = retry_interval
 
     @staticmethod
     def __step_start(tag, details):
@@ -118,7 +132,7 @@ class Step:
             "not yet", postfix=f"(attempt {self.attempt}/{self.max_attempts})", end="\r"
         )
         self.__step_start(self.tag, self.details)
-        time.sleep(1)
+        time.sleep(self.retry_interval)
 
     def __enter__(self):
         self.__step_start(self.tag, self.details)
@@ -146,6 +160,71 @@ class Step:
 
 
 MAX_ATTEMPTS = 5
+RETRY_INTERVAL = 0.1
+
+
+class BusNameReleased:
+    """Wait for a D-Bus name to lose its owner
+
+    Subscribes to the bus daemon's ``NameOwnerChanged`` signal for the
+    duration of the ``with`` block, so enter it *before* doing whatever
+    causes the name to be released, and then call ``wait()``.  This
+    returns as soon as the name has been released instead of polling
+    ``NameHasOwner``.
+
+        with BusNameReleased(bus, busname) as released:
+            service.Shutdown()
+            if dbus_service.NameHasOwner(busname):
+                released.wait(timeout)
+    """
+
+    def __init__(self, bus, busname):
+        from gi.repository import GLib
+
+        super(BusNameReleased, self).__init__()
+        self.__bus = bus
+        self.__busname = busname
+        self.__released = False
+        self.__loop = GLib.MainLoop()
+        self.__subscription = None
+
+    def __enter__(self):
+        self.__subscription = self.__bus.subscribe(
+            sender="org.freedesktop.DBus",
+            iface="org.freedesktop.DBus",
+            signal="NameOwnerChanged",
+            arg0=self.__busname,
+            signal_fired=self.__name_owner_changed,
+        )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.__subscription.unsubscribe()
+        self.__subscription = None
+        return False
+
+    def __name_owner_changed(self, sender, object_path, iface, signal, params):
+        name, old_owner, new_owner = params
+        if new_owner == "":
+            self.__released = True
+            self.__loop.quit()
+
+    def __timeout(self):
+        self.__loop.quit()
+        return False  # do not repeat the timeout
+
+    def wait(self, timeout):
+        """Wait until the name has been released, for at most timeout seconds"""
+        from gi.repository import GLib
+
+        if self.__released:
+            return
+
+        timeout_id = GLib.timeout_add_seconds(timeout, self.__timeout)
+        self.__loop.run()
+        if not self.__released:
+            raise TimeoutError(f"{self.__busname} still has an owner after {timeout}s")
+        GLib.source_remove(timeout_id)
 
 
 class ScriptCommand:
@@ -238,29 +317,43 @@ class SudoScript:
 
         self.write(sudo_script_file)
 
-        print()
         # TODO: Could be worded more nicely with dry_run==True
         if not self.needs_to_run():
-            print("No commands left over to run with sudo. Good.")
+            print_lines("", "No commands left over to run with sudo. Good.")
         elif isinstance(sudo_script_file, io.StringIO):
-            print("You should probably run the following commands with sudo:")
-            print("-" * 72)
-            sys.stdout.write(sudo_script_file.getvalue())
-            print("-" * 72)
+            print_lines(
+                "",
+                "You should probably run the following commands with sudo:",
+                "-" * 72,
+                sudo_script_file.getvalue().rstrip("\n"),
+                "-" * 72,
+            )
         else:
             sudo_script_file.close()
-            print(
-                "You should probably run this script with sudo (example command below):"
+            print_lines(
+                "",
+                "You should probably run this script with sudo (example command below):",
+                "-" * 72,
+                p.read_text().rstrip("\n"),
+                "-" * 72,
+                f"Suggested command: sudo sh {p.absolute()}",
             )
-            print("-" * 72)
-            sys.stdout.write(p.read_text())
-            print("-" * 72)
-            print("Suggested command:", "sudo", "sh", p.absolute())
 
 
 SUDO_SCRIPT = SudoScript()
 
 
+@functools.lru_cache(maxsize=None)
+def make_dir(dirpath):
+    """Create a destination directory (with parents) once per process
+
+    Many destination files share a directory, so this saves the
+    repeated ``mkdir()`` and ``stat()`` calls. As exceptions are not
+    cached, a ``PermissionError`` is raised again for every file.
+    """
+    dirpath.mkdir(mode=0o755, parents=True, exist_ok=True)
+
+
 class AbstractFile(metaclass=abc.ABCMeta):
     """Common behavior for different types of files defined as subclasses"""
 
@@ -312,7 +405,7 @@ class AbstractFile(metaclass=abc.ABCMeta):
 
         try:
             print_step("inst", self.dst)
-            self.chroot_dst.parent.mkdir(mode=0o755, parents=True, exist_ok=True)
+            make_dir(self.chroot_dst.parent)
             self.direct_install()
             self.chroot_dst.chmod(mode=0o0644)
         except PermissionError:
@@ -344,6 +437,28 @@ class AbstractFile(metaclass=abc.ABCMeta):
 RESOURCE_MODULE = "socranop"
 
 
+def iter_resource_tree(topdir):
+    """Recursively iterate over all entries below a resource directory
+
+    Yields ``(entry, is_dir)`` tuples, each directory before its
+    contents. For resources living in the file system, use
+    ``os.scandir()`` so that the file type comes from the cached
+    directory entry instead of one ``stat()`` call per entry.  Other
+    resource containers (e.g. zip files) fall back to the generic
+    ``Traversable`` interface.
+    """
+    if isinstance(topdir, Path):
+        with os.scandir(topdir) as it:
+            entries = [(topdir / dirent.name, dirent.is_dir()) for dirent in it]
+    else:
+        entries = [(entry, entry.is_dir()) for entry in topdir.iterdir()]
+
+    for entry, entry_is_dir in entries:
+        yield (entry, entry_is_dir)
+        if entry_is_dir:
+            yield from iter_resource_tree(entry)
+
+
 class ResourceFile(AbstractFile):
     """This destination file is written from a pkg_resource resource"""
 
@@ -355,9 +470,15 @@ class ResourceFile(AbstractFile):
         return f"{self.__class__.__name__}:{self.dst}:resource({self.resource_entry})"
 
     def direct_install(self):
-        self.chroot_dst.write_bytes(self.resource_entry.read_bytes())
+        if isinstance(self.resource_entry, Path):
+            # Let the kernel copy the bytes (sendfile(2) on Linux)
+            shutil.copyfile(self.resource_entry, self.chroot_dst)
+        else:
+            self.chroot_dst.write_bytes(self.resource_entry.read_bytes())
 
     def shell_install(self):
+        import base64
+
         first_line = f"base64>{self.dst}<<EOF\n"
         bio = io.BytesIO()
         res_bytes = self.resource_entry.read_binary()
@@ -675,29 +796,27 @@ class ResourceInstallTool(FileInstallTool):
     def walk_resources(self, res_subdir: str):
         common.debug("walk_resources", self, res_subdir)
 
+        # Only import this when needed, so --help and --version start quickly
+        import importlib.resources
+
         res_data = importlib.resources.files(RESOURCE_MODULE) / "data"
 
         global files_to_delete
         files_to_delete.add(res_data)
 
         td = res_data / res_subdir
-
-        def walk_resource_subdir(topdir):
-            assert topdir.is_dir()
-            global files_to_delete
-            files_to_delete.add(topdir)
-            for entry in topdir.iterdir():
-                full_name = entry.absolute()
-                common.debug(f"entry {entry} res fullname {full_name}")
-                if entry.is_dir():
-                    walk_resource_subdir(entry)
-                else:
-                    if entry.name.endswith("~"):
-                        continue  # ignore editor backup files
-                    self.add_resource(entry)
-                    files_to_delete.add(entry)
-
-        walk_resource_subdir(td)
+        assert td.is_dir()
+        files_to_delete.add(td)
+
+        for entry, entry_is_dir in iter_resource_tree(td):
+            common.debug(f"entry {entry}")
+            if entry_is_dir:
+                files_to_delete.add(entry)
+            elif entry.name.endswith("~"):
+                continue  # ignore editor backup files
+            else:
+                self.add_resource(entry)
+                files_to_delete.add(entry)
 
     @abc.abstractmethod
     def add_resource(self, resource_entry):
@@ -782,16 +901,18 @@ class DBusInstallTool(ResourceInstallTool):
             common.debug("D-Bus service not running")
         else:
             service = self._service(const.BUSNAME)
-            service_version = service.version
-            with Step(
-                "stop",
-                f"Shutting down running service version {service_version}",
-                max_attempts=MAX_ATTEMPTS,
-            ) as step:
+            if common.VERBOSE:
+                # Reading the version costs another D-Bus round trip
+                details = f"Shutting down running service version {service.version}"
+            else:
+                details = "Shutting down running service"
+            with Step("stop", details), BusNameReleased(
+                self._session_bus, const.BUSNAME
+            ) as released:
                 service.Shutdown()
                 # Wait until the shutdown clears the service off the bus
-                while dbus_service.NameHasOwner(const.BUSNAME):
-                    step.try_again()
+                if dbus_service.NameHasOwner(const.BUSNAME):
+                    released.wait(MAX_ATTEMPTS)
 
     def _verify_install(self):
         if self.no_launch:
@@ -815,7 +936,8 @@ class DBusInstallTool(ResourceInstallTool):
             "verify",
             "Checking for registered service",
             error_msg=f"The D-Bus service we just installed has not yet been detected after {MAX_ATTEMPTS}s. You may need to restart your D-Bus session (for example, by logging out and back in to your desktop).",
-            max_attempts=MAX_ATTEMPTS,
+            max_attempts=int(MAX_ATTEMPTS / RETRY_INTERVAL),
+            retry_interval=RETRY_INTERVAL,
         ) as step:
             while const.BUSNAME not in dbus_service.ListActivatableNames():
                 step.try_again()
@@ -886,9 +1008,11 @@ class ManpageInstallTool(ResourceInstallTool):
         dirs = get_dirs()
         return dirs.datadir / "man"
 
+    # Man page source files are named like ``socranop-ctl.1``
+    manpage_name_re = re.compile(r".*\.(?P<section>[1-9])")
+
     def add_resource(self, resource_entry):
-        rexpr = re.compile(r".*\.(?P<section>[1-9])")
-        m = rexpr.fullmatch(resource_entry.name)
+        m = ManpageInstallTool.manpage_name_re.fullmatch(resource_entry.name)
         if m:
             section = m.group("section")
             mandst = self._mandir() / f"man{section}" / resource_entry.name
@@ -909,6 +1033,10 @@ class XDGDesktopInstallTool(ResourceInstallTool):
 
     # FIXME05: Find out whether `xdg-desktop-menu` and `xdg-desktop-icon`
     #          must be run after all. Fedora Packaging docs suggest so.
+    #          If so, run `xdg-desktop-menu` once with all .desktop files
+    #          and `xdg-icon-resource` once per icon size with all icons
+    #          of that size, so the menu database and icon cache are only
+    #          updated once instead of once per file.
 
     def __init__(self, dry_run):
         super(XDGDesktopInstallTool, self).__init__(
@@ -916,27 +1044,40 @@ class XDGDesktopInstallTool(ResourceInstallTool):
         )
         self.walk_resources("xdg")
 
+    def _add_desktop(self, resource_entry):
+        dirs = get_dirs()
+        applications_dir = dirs.datadir / "applications"
+        dst = applications_dir / f"{const.APPLICATION_ID}.desktop"
+        templateData = {
+            "gui_bin": dirs.guiExePath,
+            "APPLICATION_ID": const.APPLICATION_ID,
+        }
+        self.add_file(TemplateFile(dst, resource_entry, templateData))
+
+    def _add_png(self, resource_entry):
+        # e.g. "io.github.socratools.socranop.256.png" has size 256
+        base = resource_entry.name.rpartition(".")[0]
+        size = int(base.rpartition(".")[2], 10)
+        dst = self._icondir(size) / f"{const.APPLICATION_ID}.png"
+        self.add_file(ResourceFile(dst, resource_entry))
+
+    def _add_svg(self, resource_entry):
+        dst = self._icondir() / f"{const.APPLICATION_ID}.svg"
+        self.add_file(ResourceFile(dst, resource_entry))
+
+    # Map file name extension to the method handling that kind of resource
+    resource_handlers = {
+        "desktop": _add_desktop,
+        "png": _add_png,
+        "svg": _add_svg,
+    }
+
     def add_resource(self, resource_entry):
-        if resource_entry.name.endswith(".desktop"):
-            dirs = get_dirs()
-            applications_dir = dirs.datadir / "applications"
-            dst = applications_dir / f"{const.APPLICATION_ID}.desktop"
-            templateData = {
-                "gui_bin": dirs.guiExePath,
-                "APPLICATION_ID": const.APPLICATION_ID,
-            }
-            self.add_file(TemplateFile(dst, resource_entry, templateData))
-        elif resource_entry.name.endswith(".png"):
-            m = len(resource_entry.name) - 4
-            n = resource_entry.name.rindex(".", 0, m) + 1
-            size = int(resource_entry.name[n:m], 10)
-            dst = self._icondir(size) / f"{const.APPLICATION_ID}.png"
-            self.add_file(ResourceFile(dst, resource_entry))
-        elif resource_entry.name.endswith(".svg"):
-            dst = self._icondir() / f"{const.APPLICATION_ID}.svg"
-            self.add_file(ResourceFile(dst, resource_entry))
-        else:
+        ext = resource_entry.name.rpartition(".")[2]
+        handler = self.resource_handlers.get(ext)
+        if handler is None:
             raise UnhandledResource(resource_entry)
+        handler(self, resource_entry)
 
     def _icondir(self, size=None):
         dirs = get_dirs()
@@ -1097,39 +1238,40 @@ class InstallToolEverything(AbstractInstallTool):
         self.everything.append(thing)
 
     def post_pip_install(self):
-        print("Socranop Installation")
-        print("=====================")
-        print()
+        print_lines("Socranop Installation", "=====================", "")
         for thing in self.everything:
             thing.post_pip_install()
-        print()
-        print(f"Socranop installation and setup completed.")
-        print()
-        print(
-            f"You can now run `{const.BASE_EXE_GUI}` or `{const.BASE_EXE_CLI}` as a regular user."
+        print_lines(
+            "",
+            "Socranop installation and setup completed.",
+            "",
+            f"You can now run `{const.BASE_EXE_GUI}` or `{const.BASE_EXE_CLI}` as a regular user.",
         )
 
     def pre_pip_uninstall(self):
-        print("Socranop Uninstallation Preparation")
-        print("===================================")
-        print()
+        print_lines(
+            "Socranop Uninstallation Preparation",
+            "===================================",
+            "",
+        )
         for thing in self.everything:
             thing.pre_pip_uninstall()
-        print()
-        print(f"Socranop uninstallation preparation completed.")
-        print()
-        print(
-            f"To complete uninstalling, run `pip uninstall {const.PACKAGE}` and (if needed) the sudo commands."
+        print_lines(
+            "",
+            "Socranop uninstallation preparation completed.",
+            "",
+            f"To complete uninstalling, run `pip uninstall {const.PACKAGE}` and (if needed) the sudo commands.",
         )
 
     def package_build_install(self):
-        print("Socranop Package Build Installation")  # TODO: Improve wording
-        print("===================================")
-        print()
+        print_lines(
+            "Socranop Package Build Installation",  # TODO: Improve wording
+            "===================================",
+            "",
+        )
         for thing in self.everything:
             thing.package_build_install()
-        print()
-        print(f"Package build installation completed.")
+        print_lines("", "Package build installation completed.")
 
 
 def command_post_pip_install(everything, args):